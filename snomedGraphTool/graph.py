@@ -1,6 +1,7 @@
 import networkx as nx
+import numpy as np
+from scipy import sparse
 from tqdm import tqdm
-from collections import Counter
 
 class SNOMEDGraphTool:
     """
@@ -36,21 +37,43 @@ class SNOMEDGraphTool:
             self.all_codes_used = X[code_column].unique()
             self.X = X
             self.y_dict = y_dict
+            self.index_patients()
             self.filter_graph()
+            self.cache_closures()
             self.add_node_attributes()
             self.update_all_nodes_with_descendant_ids()
             self.map_ids_to_labels()
 
+    def index_patients(self):
+        """
+        Assigns each patient a dense integer index and encodes their labels as an array aligned to it.
+        """
+        self.labels = list(dict.fromkeys(self.y_dict.values()))
+        label_to_idx = {label: i for i, label in enumerate(self.labels)}
+
+        self._patient_ids = np.array(list(self.y_dict), dtype=object)
+        self._id_to_idx = {patient_id: i for i, patient_id in enumerate(self.y_dict)}
+        self._y_arr = np.fromiter((label_to_idx[label] for label in self.y_dict.values()), dtype=np.int32, count=len(self.y_dict))
+        self.label_totals = np.bincount(self._y_arr, minlength=len(self.labels))
+
+    def _progress(self, iterable, desc):
+        """
+        Wraps an iteration over the graph's nodes in a progress bar that refreshes at most every percent.
+        """
+        n_nodes = len(self.G.nodes)
+        return tqdm(iterable, total=n_nodes, desc=desc, mininterval=0.5, miniters=max(1, n_nodes // 100))
+
     def build_graph(self):
         """
         Builds the directed graph using the relationships data.
         """
-        active_relationships = self.relationships[
-            (self.relationships['typeId'] == 116680003) &  # 'Is a' relationship
-            (self.relationships['active'] == 1)
-        ]
-        for _, row in tqdm(active_relationships.iterrows(), total=active_relationships.shape[0], desc='Building Graph'):
-            self.G.add_edge(row['destinationId'], row['sourceId'])
+        is_active = (
+            (self.relationships['typeId'].values == 116680003) &  # 'Is a' relationship
+            (self.relationships['active'].values == 1)
+        )
+        parents = self.relationships['destinationId'].values[is_active]
+        children = self.relationships['sourceId'].values[is_active]
+        self.G.add_edges_from(zip(parents.tolist(), children.tolist()))
 
     def filter_graph(self):
         """
@@ -58,52 +81,117 @@ class SNOMEDGraphTool:
         """
         nodes_to_keep = set(self.all_codes_used)
 
-        for node in self.all_codes_used:
-            if node in self.G:
-                ancestors = nx.ancestors(self.G, node)
-                nodes_to_keep.update(ancestors)
+        # A single reverse traversal from all used codes at once visits each ancestor only once
+        stack = [node for node in nodes_to_keep if node in self.G]
+        while stack:
+            for parent in self.G.predecessors(stack.pop()):
+                if parent not in nodes_to_keep:
+                    nodes_to_keep.add(parent)
+                    stack.append(parent)
 
         filtered_graph = self.G.subgraph(nodes_to_keep).copy()
         self.G = filtered_graph
 
+    def cache_closures(self):
+        """
+        Caches the ancestors and descendants of every node, computed in a single pass over the topological order.
+        Nodes are interned to dense indices in graph order, and the cached structures refer to nodes by index.
+        """
+        self._nodes = list(self.G.nodes)
+        self._node_to_idx = {node: i for i, node in enumerate(self._nodes)}
+        self._successors = [[self._node_to_idx[child] for child in self.G.successors(node)] for node in self._nodes]
+        predecessors = [[self._node_to_idx[parent] for parent in self.G.predecessors(node)] for node in self._nodes]
+        self._topological_order = [self._node_to_idx[node] for node in nx.topological_sort(self.G)]
+
+        self._desc = [None] * len(self._nodes)
+        for i in reversed(self._topological_order):
+            children = self._successors[i]
+            self._desc[i] = frozenset(children).union(*(self._desc[child] for child in children))
+
+        self._anc = [None] * len(self._nodes)
+        for i in self._topological_order:
+            parents = predecessors[i]
+            self._anc[i] = frozenset(parents).union(*(self._anc[parent] for parent in parents))
+
     def add_node_attributes(self):
         """
         Adds attributes (depth, label, ids) to the nodes in the graph.
         """
         root = [n for n, d in self.G.in_degree() if d == 0][0]
         depth = nx.single_source_shortest_path_length(self.G, root)
+        depths = [depth.get(node,0) for node in self._nodes]
+        code_to_ids = self.X.groupby(self.code_column)[self.id_column].agg(set).to_dict()
 
-        for node in tqdm(self.G.nodes, total=len(self.G.nodes), desc='Assigning Attributes'):
+        if self.depth_method == 'absolute':
+            # The deepest descendant of a node is the deepest of its children and their deepest descendants
+            max_descendant_depth = {}
+            for i in reversed(self._topological_order):
+                children_depths = [max(depths[child], max_descendant_depth.get(child,0)) for child in self._successors[i]]
+                if len(children_depths) > 0:
+                    max_descendant_depth[i] = max(children_depths)
+
+        self._depths = np.zeros(len(self._nodes), dtype=np.float64)
+        for i, node in enumerate(self._progress(self._nodes, 'Assigning Attributes')):
             if self.depth_method == 'absolute':
-                descendants_depth = [depth.get(descendant,0) for descendant in nx.descendants(self.G, node)]
-                self.G.nodes[node]['depth'] = depth.get(node,0)/max(descendants_depth) if len(descendants_depth) > 0 else 1
+                self.G.nodes[node]['depth'] = depths[i]/max_descendant_depth[i] if i in max_descendant_depth else 1
             elif self.depth_method == 'relative':
-                descendants = len(nx.descendants(self.G, node))
-                ancestors = len(nx.ancestors(self.G, node))
+                descendants = len(self._desc[i])
+                ancestors = len(self._anc[i])
                 self.G.nodes[node]['depth'] =ancestors/(descendants+ancestors)
+            self._depths[i] = self.G.nodes[node]['depth']
 
             self.G.nodes[node]['label'] = self.concept_dict[node]
-            self.G.nodes[node]['ids'] = set(self.X.query(f'{self.code_column} == {node}')[self.id_column])
+            self.G.nodes[node]['ids'] = code_to_ids.get(node, set())
 
     def update_all_nodes_with_descendant_ids(self):
         """
-        Updates each node with the IDs of all its descendant nodes.
+        Updates each node with the IDs of all its descendant nodes. The ids attribute of each node is read as its
+        directly coded patients, and is replaced with the patients of the node and all its descendants.
         """
-        for node in tqdm(self.G.nodes, total=len(self.G.nodes), desc='Updating Nodes'):
-            ids = self.G.nodes[node].get('ids', set())
-            descendants = nx.descendants(self.G, node)
+        n_nodes = len(self._nodes)
+
+        # Sparse (nodes x patients) matrix of the patients coded directly at each node
+        direct_ids = []
+        for node in self._nodes:
+            ids = self.G.nodes[node]['ids']
+            direct_ids.append(np.unique(np.fromiter((self._id_to_idx[id] for id in ids), dtype=np.int32, count=len(ids))))
+        direct_indptr = np.concatenate(([0], np.cumsum([len(ids) for ids in direct_ids])))
+        patients = sparse.csr_matrix(
+            (np.ones(direct_indptr[-1], dtype=np.int32), np.concatenate(direct_ids), direct_indptr),
+            shape=(n_nodes, len(self._id_to_idx))
+        )
+
+        # Sparse (nodes x nodes) matrix linking each node to itself and every one of its descendants
+        descendants = [np.fromiter(desc, dtype=np.int64, count=len(desc)) for desc in self._desc]
+        closure_indptr = np.concatenate(([0], np.cumsum([len(d) for d in descendants])))
+        closure = sparse.csr_matrix(
+            (np.ones(closure_indptr[-1], dtype=np.int32), np.concatenate(descendants), closure_indptr),
+            shape=(n_nodes, n_nodes)
+        ) + sparse.identity(n_nodes, dtype=np.int32, format='csr')
 
-            for descendant in descendants:
-                ids.update(self.G.nodes[descendant].get('ids', set()))
+        # A single sparse product gathers every patient below each node
+        membership = (closure @ patients).tocsr()
+        membership.sort_indices()
 
-            self.G.nodes[node]['ids'] = ids
+        # The dense patient indices are kept for counting, and the node attribute holds the original patient IDs
+        self._node_ids = [None] * n_nodes
+        for i, node in enumerate(self._nodes):
+            self._node_ids[i] = membership.indices[membership.indptr[i]:membership.indptr[i + 1]]
+            self.G.nodes[node]['ids'] = set(self._patient_ids[self._node_ids[i]].tolist())
 
     def map_ids_to_labels(self):
         """
-        Maps patient IDs to labels for each node and counts the labels.
+        Maps patient IDs to labels for each node and counts the labels and patients. The IDs counted are those
+        gathered by the last call to update_all_nodes_with_descendant_ids; later edits to the ids attribute are not read.
         """
-        for node in tqdm(self.G.nodes, total=len(self.G.nodes), desc='Mapping Nodes'):
-            self.G.nodes[node]['label_counts'] = dict(Counter([self.y_dict[id] for id in self.G.nodes.get(node)['ids']]))
+        self._label_counts = np.zeros((len(self._nodes), len(self.labels)), dtype=np.int64)
+        self._total_counts = np.zeros(len(self._nodes), dtype=np.int64)
+        for i, node in enumerate(self._progress(self._nodes, 'Mapping Nodes')):
+            counts = np.bincount(self._y_arr[self._node_ids[i]], minlength=len(self.labels))
+            self._label_counts[i] = counts
+            self._total_counts[i] = len(self._node_ids[i])
+            self.G.nodes[node]['label_counts'] = {label: int(count) for label, count in zip(self.labels, counts) if count > 0}
+            self.G.nodes[node]['total_count'] = int(self._total_counts[i])
     
     def assign_patients_to_nodes(self, X):
         """
@@ -115,15 +203,40 @@ class SNOMEDGraphTool:
         self.map_ids_to_labels()
 
 
-    def score_nodes(self, scorer):
+    def label_count_matrix(self):
+        """
+        Gets the label counts of every node as a single matrix.
+
+        Returns:
+        numpy.ndarray: An array of shape (nodes, labels), with rows ordered as the graph's nodes and columns as self.labels.
+        """
+        return self._label_counts
+
+    def score_nodes(self, scorer, vectorized=False, positive_label=1):
         """
         Scores the nodes using the provided scoring function.
         
         Parameters:
         scorer (function): A function that takes the graph and a node, and returns a score.
+        vectorized (bool, optional): If True, scorer instead takes the label count matrix, the label totals and label_idx, the column of the positive label, and returns every node's score at once. Defaults to False.
+        positive_label (optional): The label treated as the positive class by vectorized scorers. Defaults to 1.
+        """
+        nx.set_node_attributes(self.G, dict(zip(self._nodes, self._compute_scores(scorer, vectorized, positive_label).tolist())), 'score')
+
+    def _compute_scores(self, scorer, vectorized, positive_label):
+        """
+        Computes the score of every node with the provided scoring function, as an array in node index order.
         """
-        for node in tqdm(self.G.nodes, total=len(self.G.nodes), desc='Scoring Nodes'):
-            self.G.nodes[node]['score'] = scorer(self.G, node)
+        if vectorized:
+            if positive_label not in self.labels:
+                raise ValueError(f"Invalid positive_label: {positive_label}. Must be one of {self.labels}.")
+            scores = scorer(self.label_count_matrix(), self.label_totals, label_idx=self.labels.index(positive_label))
+            return np.asarray(scores, dtype=np.float64)
+
+        scores = np.zeros(len(self._nodes), dtype=np.float64)
+        for i, node in enumerate(self._progress(self._nodes, 'Scoring Nodes')):
+            scores[i] = scorer(self.G, node)
+        return scores
 
     def weight_scores(self, weight):
         """
@@ -132,35 +245,43 @@ class SNOMEDGraphTool:
         Parameters:
         weight (float): The weight to apply to the node depth.
         """
-        for node in tqdm(self.G.nodes, total=len(self.G.nodes), desc='Weighting Node Scores'):
+        for node in self._progress(self.G.nodes, 'Weighting Node Scores'):
             self.G.nodes[node]['weighted_score'] = abs(self.G.nodes[node]['score']) * (1 + (self.G.nodes[node]['depth'] * weight))
 
-    def get_eligible_nodes(self, scorer, total_patients, rarity_threshold=0.05, min_depth=0.1, weight=None):
+    def get_eligible_nodes(self, scorer, total_patients, rarity_threshold=0.05, min_depth=0.1, weight=None, vectorized=False, positive_label=1):
         """
         Gets the eligible nodes based on their scores, avoiding ancestors and descendants of selected nodes.
+        Node depths and patient counts are read from the values cached by add_node_attributes and map_ids_to_labels,
+        so the depth and total_count attributes are outputs only; use assign_patients_to_nodes to recompute them.
         
         Parameters:
         scorer (function): A function that takes the graph and a node, and returns a score.
         weight (float, optional): The weight to apply to the node depth. Defaults to None.
+        vectorized (bool, optional): Whether scorer scores all nodes at once, as described in score_nodes. Defaults to False.
+        positive_label (optional): The label treated as the positive class by vectorized scorers. Defaults to 1.
         
         Returns:
         list: A list of eligible nodes sorted by their weighted scores.
         """
-        self.score_nodes(scorer)
-        self.weight_scores(weight if weight else 0)
+        # Scoring and depth weighting are done in one pass over arrays, and the results written back once
+        scores = self._compute_scores(scorer, vectorized, positive_label)
+        weighted_scores = np.abs(scores) * (1 + (self._depths * (weight if weight else 0)))
+        nx.set_node_attributes(self.G, dict(zip(self._nodes, scores.tolist())), 'score')
+        nx.set_node_attributes(self.G, dict(zip(self._nodes, weighted_scores.tolist())), 'weighted_score')
 
-        sorted_nodes = sorted(self.G.nodes(data=True), key=lambda x: x[1].get('weighted_score', 0), reverse=True)
+        # Nodes failing the rarity or depth criteria can never be selected, so only the rest are sorted
+        threshold = total_patients * rarity_threshold
+        eligible = np.flatnonzero((self._total_counts > threshold) & (self._depths > min_depth))
         
-        tabu = []
+        tabu = set()
         candidate_nodes = []
-        while len(sorted_nodes) > 0:
-            if (sum(sorted_nodes[0][1]['label_counts'].values()) > (total_patients*rarity_threshold)) & (sorted_nodes[0][1]['depth'] > min_depth):
-                if sorted_nodes[0][0] not in tabu:
-                    candidate_nodes += [sorted_nodes[0]]
-                    tabu += [sorted_nodes[0][0]]
-                    tabu += [v for v in nx.ancestors(self.G, sorted_nodes[0][0])]
-                    tabu += [v for v in nx.descendants(self.G, sorted_nodes[0][0])]
-
-            sorted_nodes.pop(0)
+        for i in eligible[np.argsort(-weighted_scores[eligible], kind='stable')].tolist():
+            if i in tabu:
+                continue
+            node = self._nodes[i]
+            candidate_nodes.append((node, self.G.nodes[node]))
+            tabu.add(i)
+            tabu.update(self._anc[i])
+            tabu.update(self._desc[i])
 
         return candidate_nodes
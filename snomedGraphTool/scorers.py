@@ -1,5 +1,20 @@
 import math
-from scipy.stats import chi2_contingency
+import numpy as np
+
+def difference_scores(counts, totals, label_idx=1):
+    """
+    Calculates the difference between the proportions of two labels from label count arrays.
+
+    Parameters:
+    counts (numpy.ndarray): The label counts, with labels along the last axis.
+    totals (numpy.ndarray): The total count of each label.
+    label_idx (int, optional): The position of the positive label along the last axis. Defaults to 1.
+
+    Returns:
+    numpy.ndarray: The difference between the proportions of the positive label and the other label.
+    """
+    proportions = counts / totals
+    return proportions[..., label_idx] - proportions[..., 1 - label_idx]
 
 def agg_difference(g, node, label_totals):
     """
@@ -34,9 +49,25 @@ def entropy(proportions):
     entropy_value = 0
     for p in proportions:
         if p > 0:
-            entropy_value -= p * math.log(p, 2)
+            entropy_value -= p * math.log2(p)
     return 1 - entropy_value
 
+def entropy_scores(counts, totals, label_idx=1):
+    """
+    Calculates the entropy of label proportions from label count arrays.
+
+    Parameters:
+    counts (numpy.ndarray): The label counts, with labels along the last axis.
+    totals (numpy.ndarray): The total count of each label.
+    label_idx (int, optional): The position of the positive label. Unused, as entropy treats all labels alike; accepted so that every array scorer takes the same arguments.
+
+    Returns:
+    numpy.ndarray: The entropy value of the label proportions.
+    """
+    proportions = counts / totals
+    log_proportions = np.log2(proportions, out=np.zeros_like(proportions), where=proportions > 0)
+    return 1 + np.sum(proportions * log_proportions, axis=-1)
+
 def agg_entropy(g, node, label_totals):
     """
     Calculates the entropy of label proportions for a given node.
@@ -82,6 +113,68 @@ def get_contingency_matrix(label_totals, label_counts, label):
     TN = sum(label_totals.values()) - TP - FP - FN
     return TP, TN, FP, FN
 
+def get_contingency_arrays(counts, totals, label_idx):
+    """
+    Compute the contingency matrix for a given label from label count arrays.
+
+    Parameters:
+    counts (numpy.ndarray): The label counts, with labels along the last axis.
+    totals (numpy.ndarray): The total count of each label.
+    label_idx (int): The position of the label along the last axis.
+
+    Returns:
+    tuple: A tuple containing four arrays (TP, TN, FP, FN), as in get_contingency_matrix.
+    """
+    TP = counts[..., label_idx]
+    FN = totals[label_idx] - TP
+    FP = counts.sum(axis=-1) - TP
+    TN = totals.sum() - TP - FP - FN
+    return TP, TN, FP, FN
+
+def _has_empty_margin(TP, TN, FP, FN):
+    """
+    Checks whether any row or column of a 2x2 contingency table is empty, in which case the chi-squared statistic is undefined.
+
+    Parameters:
+    TP, TN, FP, FN (int or numpy.ndarray): The cells of the contingency table, as returned by get_contingency_matrix.
+
+    Returns:
+    bool or numpy.ndarray: True where a row or column total is zero.
+    """
+    return ((TP + FP) == 0) | ((FN + TN) == 0) | ((TP + FN) == 0) | ((FP + TN) == 0)
+
+def _yates_chi2(TP, TN, FP, FN):
+    """
+    Calculates the chi-squared statistic of a 2x2 contingency table in closed form, with the Yates continuity
+    correction that scipy's chi2_contingency applies to 2x2 tables by default. Works on scalars and arrays alike.
+
+    Parameters:
+    TP, TN, FP, FN (int, float or numpy.ndarray): The cells of the contingency table, none of whose rows or columns may be empty.
+
+    Returns:
+    float or numpy.ndarray: The chi-squared statistic.
+    """
+    grand_total = TP + TN + FP + FN
+    corrected = abs(TP * TN - FP * FN) - grand_total / 2
+    corrected = corrected * (corrected > 0)
+    return grand_total * corrected ** 2 / ((TP + FP) * (FN + TN) * (TP + FN) * (FP + TN))
+
+def chi2_scores(counts, totals, label_idx=1):
+    """
+    Calculates the chi-squared statistic for a given label from label count arrays.
+
+    Parameters:
+    counts (numpy.ndarray): The label counts, with labels along the last axis.
+    totals (numpy.ndarray): The total count of each label.
+    label_idx (int, optional): The position of the label along the last axis. Defaults to 1.
+
+    Returns:
+    numpy.ndarray: The chi-squared statistic.
+    """
+    TP, TN, FP, FN = (x.astype(np.float64) for x in get_contingency_arrays(counts, totals, label_idx))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(_has_empty_margin(TP, TN, FP, FN), 0.0, _yates_chi2(TP, TN, FP, FN))
+
 def agg_chi2(g, node, label_totals):
     """
     Aggregate the chi-squared statistic for a node in a graph based on label counts.
@@ -95,12 +188,32 @@ def agg_chi2(g, node, label_totals):
     float: The chi-squared statistic for the given node.
     """
     TP, TN, FP, FN = get_contingency_matrix(label_totals, g.nodes[node]['label_counts'], 1)
-    contingency_table = [[TP, FP], [FN, TN]]
-    try:
-        chi2, _, _, _ = chi2_contingency(contingency_table)
-    except:
-        chi2 = 0
-    return chi2
+    if _has_empty_margin(TP, TN, FP, FN):
+        return 0
+    return _yates_chi2(TP, TN, FP, FN)
+
+def odds_ratio_scores(counts, totals, label_idx=1):
+    """
+    Calculates the odds ratio for a given label from label count arrays, inverted when below one.
+
+    Parameters:
+    counts (numpy.ndarray): The label counts, with labels along the last axis.
+    totals (numpy.ndarray): The total count of each label.
+    label_idx (int, optional): The position of the label along the last axis. Defaults to 1.
+
+    Returns:
+    numpy.ndarray: The odds ratio, or -1 where it is undefined.
+    """
+    TP, TN, FP, FN = get_contingency_arrays(counts, totals, label_idx)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Prevent division by zero
+        odds_ratio = np.where((FP == 0) | (FN == 0), -1.0, (TP * TN) / (FP * FN))
+
+        # If odds ratio is less than 1, invert it
+        odds_ratio = np.where((odds_ratio < 1) & (odds_ratio != 0), 1 / odds_ratio, odds_ratio)
+
+    return odds_ratio
 
 def agg_odds_ratio(g, node, label_totals):
     """